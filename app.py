@@ -1,11 +1,20 @@
 import os
-import json
-from datetime import datetime, time
-import pytz
-from flask import Flask, render_template, request, redirect, url_for, flash, abort
+import sqlite3
+from datetime import date, datetime, time, timedelta
+from zoneinfo import ZoneInfo
+import orjson
+from flask import Flask, render_template, request, redirect, url_for, flash, abort, make_response, session
 from flask_sqlalchemy import SQLAlchemy
+from sqlalchemy import cast, event, func, inspect, or_, select, text
+from sqlalchemy.engine import Engine
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import load_only, raiseload
+from sqlalchemy.dialects.postgresql import JSONB
 from flask_login import LoginManager, UserMixin, login_user, logout_user, current_user, login_required
-from werkzeug.security import generate_password_hash, check_password_hash
+from werkzeug.http import generate_etag, is_resource_modified
+from werkzeug.security import check_password_hash
+from argon2 import PasswordHasher
+from argon2.exceptions import VerificationError, InvalidHashError
 from dotenv import load_dotenv
 
 # .envファイルから環境変数を読み込む
@@ -16,32 +25,76 @@ app.config['SECRET_KEY'] = os.environ.get('SECRET_KEY', 'dev')
 app.config['SQLALCHEMY_DATABASE_URI'] = os.environ.get('DATABASE_URL', 'sqlite:///kiroku.db')
 app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
 
+# --- コネクションプール設定 ---
+# gunicorn のワーカー数 × スレッド数 で同時に接続を使うことを前提にする
+if app.config['SQLALCHEMY_DATABASE_URI'].startswith('sqlite'):
+    app.config['SQLALCHEMY_ENGINE_OPTIONS'] = {
+        'connect_args': {'check_same_thread': False},
+    }
+else:
+    app.config['SQLALCHEMY_ENGINE_OPTIONS'] = {
+        'pool_size': 10,
+        'max_overflow': 20,
+        'pool_pre_ping': True,
+        'pool_recycle': 1800,
+    }
+
+# JSON カラムのエンコード/デコードには標準の json より高速な orjson を使う
+app.config['SQLALCHEMY_ENGINE_OPTIONS'].update({
+    'json_serializer': lambda obj: orjson.dumps(obj).decode(),
+    'json_deserializer': orjson.loads,
+})
+
 db = SQLAlchemy(app)
 login_manager = LoginManager(app)
 login_manager.login_view = 'login'
 login_manager.login_message = "このページにアクセスするにはログインが必要です。"
 
+# --- パスワードハッシュ設定 (Argon2id) ---
+# パラメータ検証のコストを避けるため、インスタンスはモジュールで1つだけ生成する
+password_hasher = PasswordHasher()
+
 # --- タイムゾーン設定 ---
-JST = pytz.timezone('Asia/Tokyo')
+JST = ZoneInfo('Asia/Tokyo')
+UTC = ZoneInfo('UTC')
+
+# --- 一覧表示の1ページあたりの件数 ---
+RECORDS_PER_PAGE = 30
+# --- 一覧に既定で表示する期間 (日数) ---
+RECENT_RECORD_DAYS = 90
 
 # --- 部位定義 ---
 STIFFNESS_FINGER_PARTS = {
     'R': {'R_Thumb': '親指', 'R_Index': '人差し指', 'R_Middle': '中指', 'R_Ring': '薬指', 'R_Pinky': '小指'},
     'L': {'L_Thumb': '親指', 'L_Index': '人差し指', 'L_Middle': '中指', 'L_Ring': '薬指', 'L_Pinky': '小指'}
 }
+# stiffness_name フィルタ用に左右をまとめた {部位ID: 名前} の辞書
+_STIFFNESS_FLAT = {pid: name for hand in STIFFNESS_FINGER_PARTS.values() for pid, name in hand.items()}
 
 # --- データベースモデル定義 ---
 class User(UserMixin, db.Model):
     id = db.Column(db.Integer, primary_key=True)
-    username = db.Column(db.String(100), unique=True, nullable=False)
+    username = db.Column(db.String(100), unique=True, nullable=False, index=True)
     password_hash = db.Column(db.String(200), nullable=False)
-    records = db.relationship('Record', backref='author', lazy=True, cascade="all, delete-orphan")
+    # 記録の削除はデータベースの ON DELETE CASCADE に任せ、ORM で子を読み込まない
+    records = db.relationship('Record', back_populates='author', lazy=True, cascade="all, delete-orphan", passive_deletes=True)
 
     def set_password(self, password):
-        self.password_hash = generate_password_hash(password)
+        self.password_hash = password_hasher.hash(password)
 
     def check_password(self, password):
-        return check_password_hash(self.password_hash, password)
+        if not self.password_hash.startswith('$argon2'):
+            # 移行前に Werkzeug (PBKDF2/scrypt) で作成されたハッシュ
+            return check_password_hash(self.password_hash, password)
+        try:
+            return password_hasher.verify(self.password_hash, password)
+        except (VerificationError, InvalidHashError):
+            return False
+
+    def password_needs_rehash(self):
+        if not self.password_hash.startswith('$argon2'):
+            return True
+        return password_hasher.check_needs_rehash(self.password_hash)
 
 class Record(db.Model):
     id = db.Column(db.Integer, primary_key=True)
@@ -49,9 +102,46 @@ class Record(db.Model):
     created_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
     numbness_strength = db.Column(db.Integer, default=0)
     numbness_parts = db.Column(db.String(200), default='')
-    stiffness = db.Column(db.Text, default='{}')
+    # PostgreSQL では JSONB、それ以外 (SQLite など) では JSON として保存し、取得時は dict で返る
+    stiffness = db.Column(db.JSON().with_variant(JSONB, 'postgresql'), default=dict)
+    # グラフ描画用に stiffness['strength'] の値を数値カラムとしても保持する
+    stiffness_r_hand = db.Column(db.SmallInteger, default=0)
+    stiffness_l_hand = db.Column(db.SmallInteger, default=0)
+    stiffness_r_knee = db.Column(db.SmallInteger, default=0)
+    stiffness_l_knee = db.Column(db.SmallInteger, default=0)
     memo = db.Column(db.Text, default='')
-    user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
+    user_id = db.Column(db.Integer, db.ForeignKey('user.id', ondelete='CASCADE'), nullable=False)
+    author = db.relationship('User', back_populates='records')
+
+    # 一覧・レポートの絞り込みと並び順 (user_id, date DESC, created_at DESC) に合わせた複合インデックス
+    __table_args__ = (
+        db.Index('ix_record_user_date_created', user_id, date.desc(), created_at.desc()),
+    )
+
+# 数値カラム名と stiffness['strength'] のキーの対応 (upgrade-db での埋め戻しに使う)
+STIFFNESS_STRENGTH_COLUMNS = {
+    'stiffness_r_hand': 'R_Hand',
+    'stiffness_l_hand': 'L_Hand',
+    'stiffness_r_knee': 'R_Knee',
+    'stiffness_l_knee': 'L_Knee',
+}
+
+# --- SQLite設定 ---
+@event.listens_for(Engine, 'connect')
+def set_sqlite_pragma(dbapi_connection, connection_record):
+    # 複数ワーカーからの読み書きが互いにブロックしないよう WAL モードにし、
+    # ON DELETE CASCADE が効くよう外部キー制約を有効にする
+    if isinstance(dbapi_connection, sqlite3.Connection):
+        cursor = dbapi_connection.cursor()
+        cursor.execute('PRAGMA journal_mode=WAL')
+        cursor.execute('PRAGMA foreign_keys=ON')
+        cursor.close()
+
+# --- ユーザー登録 ---
+def is_username_conflict(error):
+    # SQLite: "UNIQUE constraint failed: user.username"
+    # PostgreSQL: "... Key (username)=(...) already exists."
+    return 'username' in str(error.orig)
 
 # --- Flask-Login設定 ---
 @login_manager.user_loader
@@ -61,27 +151,42 @@ def load_user(user_id):
 # --- カスタムフィルタ ---
 @app.template_filter('stiffness_name')
 def stiffness_name_filter(part_id):
-    for hand in STIFFNESS_FINGER_PARTS.values():
-        if part_id in hand:
-            return hand[part_id]
-    return part_id
+    return _STIFFNESS_FLAT.get(part_id, part_id)
 
 @app.template_filter('to_jst')
 def to_jst_filter(utc_dt):
     if utc_dt is None:
         return ""
-    return utc_dt.replace(tzinfo=pytz.utc).astimezone(JST).strftime('%Y-%m-%d %H:%M')
+    return utc_dt.replace(tzinfo=UTC).astimezone(JST).strftime('%Y-%m-%d %H:%M')
 
 @app.template_filter('to_jst_time')
 def to_jst_time_filter(utc_dt):
     if utc_dt is None:
         return ""
-    return utc_dt.replace(tzinfo=pytz.utc).astimezone(JST).strftime('%H:%M')
-
-# --- ヘルスチェック用ルート ---
-@app.route('/health')
-def health_check():
-    return "OK", 200
+    return utc_dt.replace(tzinfo=UTC).astimezone(JST).strftime('%H:%M')
+
+# --- HTTPキャッシュ ---
+def set_validators(response, etag):
+    # ブラウザにはキャッシュを保持させつつ、毎回 ETag で再検証させる
+    # (Last-Modified は記録の削除や日付の変化を表せないため送らない)
+    response.set_etag(etag)
+    response.cache_control.private = True
+    response.cache_control.no_cache = True
+    return response
+
+# --- ヘルスチェック用ミドルウェア ---
+# 死活監視は数秒おきに呼ばれるため、Flask のルーティング・セッション・ログイン処理を通さずに応答する
+class HealthMiddleware:
+    def __init__(self, wsgi_app):
+        self.wsgi_app = wsgi_app
+
+    def __call__(self, environ, start_response):
+        if environ.get('PATH_INFO') == '/health':
+            start_response('200 OK', [('Content-Type', 'text/plain'), ('Content-Length', '2')])
+            return [b'OK']
+        return self.wsgi_app(environ, start_response)
+
+app.wsgi_app = HealthMiddleware(app.wsgi_app)
 
 # --- ルート定義 ---
 @app.route('/', methods=['GET', 'POST'])
@@ -89,7 +194,7 @@ def health_check():
 def index():
     if request.method == 'POST':
         try:
-            date = datetime.strptime(request.form['date'], '%Y-%m-%d').date()
+            record_date = date.fromisoformat(request.form['date'])
         except ValueError:
             flash('日付の形式が正しくありません。', 'danger')
             return redirect(url_for('index'))
@@ -105,29 +210,56 @@ def index():
         }
 
         new_record = Record(
-            date=date,
+            date=record_date,
             numbness_strength=request.form.get('numbness_strength', 0, type=int),
             numbness_parts=','.join(request.form.getlist('numbness_parts')),
-            stiffness=json.dumps(stiffness_data, ensure_ascii=False),
+            stiffness=stiffness_data,
+            stiffness_r_hand=request.form.get('stiffness_strength_R_Hand', 0, type=int),
+            stiffness_l_hand=request.form.get('stiffness_strength_L_Hand', 0, type=int),
+            stiffness_r_knee=request.form.get('stiffness_strength_R_Knee', 0, type=int),
+            stiffness_l_knee=request.form.get('stiffness_strength_L_Knee', 0, type=int),
             memo=request.form['memo'],
-            author=current_user
+            user_id=current_user.id
         )
         db.session.add(new_record)
         db.session.commit()
         flash('記録が保存されました。', 'success')
         return redirect(url_for('index'))
 
-    records = Record.query.filter_by(author=current_user).order_by(Record.date.desc(), Record.created_at.desc()).all()
-    for record in records:
-        try:
-            record.stiffness_data = json.loads(record.stiffness)
-        except json.JSONDecodeError:
-            record.stiffness_data = {'parts': [], 'strength': {}}
-
-    return render_template('index.html', 
+    page = request.args.get('page', 1, type=int)
+    show_all = request.args.get('all') == '1'
+    today = datetime.now(JST).date()
+
+    # 一覧は記録の追加・削除と日付の変化でしか変わらないため、件数・最終作成日時・今日の日付から
+    # ETag を作り、変化が無ければ描画せずに 304 を返す (フラッシュメッセージの表示待ちがある場合は除く)
+    record_count, last_created_at = db.session.query(
+        func.count(Record.id), func.max(Record.created_at)
+    ).filter(Record.user_id == current_user.id).one()
+    etag = generate_etag(
+        f'{current_user.id}:{record_count}:{last_created_at}:{today}:{page}:{show_all}'.encode()
+    )
+    if '_flashes' not in session and not is_resource_modified(
+            request.environ, etag=etag):
+        return set_validators(make_response('', 304), etag)
+
+    # テンプレートはリレーションを参照しないため、誤った遅延ロード (N+1) は例外にする
+    query = Record.query.options(raiseload('*')).filter(Record.user_id == current_user.id)
+    if not show_all:
+        # 既定では直近の記録のみを対象にし、古い記録は明示的に指定された場合だけ読み込む
+        query = query.filter(Record.date >= today - timedelta(days=RECENT_RECORD_DAYS))
+    pagination = query.order_by(
+        Record.date.desc(), Record.created_at.desc()
+    ).paginate(page=page, per_page=RECORDS_PER_PAGE, error_out=False)
+    records = pagination.items
+
+    response = make_response(render_template('index.html', 
                            records=records, 
-                           today=datetime.now(JST).strftime('%Y-%m-%d'),
-                           stiffness_finger_parts=STIFFNESS_FINGER_PARTS)
+                           pagination=pagination,
+                           show_all=show_all,
+                           recent_record_days=RECENT_RECORD_DAYS,
+                           today=today.isoformat(),
+                           stiffness_finger_parts=STIFFNESS_FINGER_PARTS))
+    return set_validators(response, etag)
 
 @app.route('/register', methods=['GET', 'POST'])
 def register():
@@ -142,14 +274,19 @@ def register():
             flash('パスワードが一致しません。', 'danger')
             return redirect(url_for('register'))
 
-        user = User.query.filter_by(username=username).first()
-        if user:
+        # ユーザー名の重複は事前に SELECT せず、一意制約違反で検出する。
+        # 重複した登録でハッシュ計算のコストを払わないよう、仮のハッシュで INSERT してから設定する
+        new_user = User(username=username, password_hash='')
+        db.session.add(new_user)
+        try:
+            db.session.flush()
+        except IntegrityError as e:
+            db.session.rollback()
+            if not is_username_conflict(e):
+                raise
             flash('そのユーザー名は既に使用されています。', 'danger')
             return redirect(url_for('register'))
-
-        new_user = User(username=username)
         new_user.set_password(password)
-        db.session.add(new_user)
         db.session.commit()
         flash('登録が完了しました。ログインしてください。', 'success')
         return redirect(url_for('login'))
@@ -166,6 +303,10 @@ def login():
         if user is None or not user.check_password(password):
             flash('ユーザー名またはパスワードが正しくありません。', 'danger')
             return redirect(url_for('login'))
+        if user.password_needs_rehash():
+            # 旧形式・旧パラメータのハッシュはログイン成功時に作り直す
+            user.set_password(password)
+            db.session.commit()
         login_user(user, remember=True)
         flash('ログインしました。', 'success')
         return redirect(url_for('index'))
@@ -184,7 +325,7 @@ def delete_record(record_id):
     record = db.session.get(Record, record_id)
     if record is None:
         abort(404) # Not Found
-    if record.author != current_user:
+    if record.user_id != current_user.id:
         abort(403) # Forbidden
     db.session.delete(record)
     db.session.commit()
@@ -194,6 +335,8 @@ def delete_record(record_id):
 @app.route('/delete_account', methods=['POST'])
 @login_required
 def delete_account():
+    # 記録は1件ずつ読み込まず、1回の DELETE 文でまとめて削除する
+    Record.query.filter(Record.user_id == current_user.id).delete(synchronize_session=False)
     db.session.delete(current_user)
     db.session.commit()
     logout_user()
@@ -211,50 +354,57 @@ def report():
         return redirect(url_for('index'))
 
     try:
-        start_date = datetime.strptime(start_date_str, '%Y-%m-%d')
-        end_date = datetime.strptime(end_date_str, '%Y-%m-%d').replace(hour=23, minute=59, second=59)
+        start_date = datetime.combine(date.fromisoformat(start_date_str), time.min)
+        end_date = datetime.combine(date.fromisoformat(end_date_str), time(23, 59, 59))
     except ValueError:
         flash('日付の形式が正しくありません。', 'danger')
         return redirect(url_for('index'))
 
-    start_date_utc = JST.localize(start_date).astimezone(pytz.utc)
-    end_date_utc = JST.localize(end_date).astimezone(pytz.utc)
+    start_date_utc = start_date.replace(tzinfo=JST).astimezone(UTC)
+    end_date_utc = end_date.replace(tzinfo=JST).astimezone(UTC)
 
-    records = Record.query.filter(
+    period_filter = (
         Record.user_id == current_user.id,
         Record.created_at >= start_date_utc,
         Record.created_at <= end_date_utc
-    ).order_by(Record.date.desc(), Record.created_at.desc()).all()
-
-    # グラフ用データを作成
-    labels = []
-    for record in records:
-        jst_time_part = record.created_at.replace(tzinfo=pytz.utc).astimezone(JST).strftime('%H:%M')
-        date_part = record.date.strftime('%m/%d')
-        labels.append(f"{date_part} {jst_time_part}")
-
-    numbness_data = [record.numbness_strength for record in records]
-    
-    stiffness_r_hand_data = []
-    stiffness_l_hand_data = []
-    stiffness_r_knee_data = []
-    stiffness_l_knee_data = []
-
-    for record in records:
-        try:
-            stiffness_dict = json.loads(record.stiffness)
-            strength = stiffness_dict.get('strength', {})
-            stiffness_r_hand_data.append(int(strength.get('R_Hand', 0)))
-            stiffness_l_hand_data.append(int(strength.get('L_Hand', 0)))
-            stiffness_r_knee_data.append(int(strength.get('R_Knee', 0)))
-            stiffness_l_knee_data.append(int(strength.get('L_Knee', 0)))
-            record.stiffness_data = stiffness_dict # テンプレートのテーブル表示用
-        except json.JSONDecodeError:
-            stiffness_r_hand_data.append(0)
-            stiffness_l_hand_data.append(0)
-            stiffness_r_knee_data.append(0)
-            stiffness_l_knee_data.append(0)
-            record.stiffness_data = {'parts': [], 'strength': {}}
+    )
+    period_order = (Record.date.desc(), Record.created_at.desc())
+
+    # テーブル表示用 (テンプレートが参照するカラムのみを読み込む)
+    records = Record.query.options(
+        load_only(
+            Record.created_at,
+            Record.numbness_strength,
+            Record.numbness_parts,
+            Record.stiffness,
+            Record.memo,
+            raiseload=True
+        ),
+        raiseload('*')
+    ).filter(*period_filter).order_by(*period_order).all()
+
+    # グラフ用データを作成 (数値カラムのみを取得し、JSON は参照しない)
+    chart_rows = db.session.execute(
+        select(
+            Record.date,
+            Record.created_at,
+            Record.numbness_strength,
+            Record.stiffness_r_hand,
+            Record.stiffness_l_hand,
+            Record.stiffness_r_knee,
+            Record.stiffness_l_knee
+        ).where(*period_filter).order_by(*period_order)
+    ).all()
+
+    # 行のタプルを列ごとのタプルに転置する (記録が無い場合は空の列)
+    (dates, created_ats, numbness_data,
+     stiffness_r_hand_data, stiffness_l_hand_data,
+     stiffness_r_knee_data, stiffness_l_knee_data) = tuple(zip(*chart_rows)) or ((),) * 7
+
+    labels = [
+        f"{d.strftime('%m/%d')} {c.replace(tzinfo=UTC).astimezone(JST).strftime('%H:%M')}"
+        for d, c in zip(dates, created_ats)
+    ]
 
     chart_data = {
         'labels': labels,
@@ -281,10 +431,123 @@ def init_db_command():
     db.create_all()
     print("データベースを初期化しました。")
 
-# アプリケーションコンテキスト内でデータベーステーブルを作成
-# gunicorn が app オブジェクトをロードする際に実行されるようにする
-with app.app_context():
-    db.create_all()
+def parse_strength(value):
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        return 0
+
+def load_stiffness_text(value):
+    # 旧スキーマ (TEXT) の値を dict に戻す。壊れた JSON は None
+    if value is None:
+        return {}
+    try:
+        data = orjson.loads(value)
+    except orjson.JSONDecodeError:
+        return None
+    return data if isinstance(data, dict) else None
+
+# --- スキーマ移行 (upgrade-db) ---
+# 各ステップは既に適用済みなら何もしないこと
+def upgrade_record_index(conn):
+    # 一覧・レポート用の複合インデックスを作成する
+    for index in Record.__table__.indexes:
+        index.create(conn, checkfirst=True)
+
+def upgrade_stiffness_json(conn):
+    # TEXT の stiffness を JSON として読めるようにする (PostgreSQL では JSONB に変換する)
+    stiffness_type = next(c['type'] for c in inspect(conn).get_columns('record') if c['name'] == 'stiffness')
+    if isinstance(stiffness_type, db.JSON):
+        return
+
+    # 変換前に、JSON として読めない値を空の dict にしておく
+    record_table = Record.__table__
+    rows = conn.execute(select(record_table.c.id, cast(record_table.c.stiffness, db.Text))).all()
+    for row_id, value in rows:
+        if load_stiffness_text(value) is None:
+            conn.execute(text("UPDATE record SET stiffness = '{}' WHERE id = :id"), {'id': row_id})
+
+    if conn.dialect.name == 'postgresql':
+        conn.execute(text('ALTER TABLE record ALTER COLUMN stiffness TYPE JSONB USING stiffness::jsonb'))
+
+def upgrade_stiffness_strength_columns(conn):
+    # 数値カラムを追加し、未設定の記録を stiffness['strength'] から埋め戻す
+    record_table = Record.__table__
+    columns = {c['name'] for c in inspect(conn).get_columns('record')}
+    for name in STIFFNESS_STRENGTH_COLUMNS:
+        if name not in columns:
+            conn.execute(text(f'ALTER TABLE record ADD COLUMN {name} SMALLINT'))
+
+    strength_columns = [record_table.c[name] for name in STIFFNESS_STRENGTH_COLUMNS]
+    rows = conn.execute(
+        select(record_table.c.id, cast(record_table.c.stiffness, db.Text))
+        .where(or_(*[column.is_(None) for column in strength_columns]))
+    ).all()
+    for row_id, value in rows:
+        strength = (load_stiffness_text(value) or {}).get('strength') or {}
+        conn.execute(
+            record_table.update().where(record_table.c.id == row_id).values({
+                name: parse_strength(strength.get(key, 0)) for name, key in STIFFNESS_STRENGTH_COLUMNS.items()
+            })
+        )
 
-if __name__ == '__main__':
-    app.run(debug=True)
+def upgrade_username_index(conn):
+    # username に一意制約・一意インデックスがまだ無い場合だけ ix_user_username を作成する
+    # (旧スキーマの UNIQUE (username) と同じ内容のインデックスを二重に作らない)
+    inspector = inspect(conn)
+    has_unique = any(
+        uc['column_names'] == ['username'] for uc in inspector.get_unique_constraints('user')
+    ) or any(
+        ix['unique'] and ix['column_names'] == ['username'] for ix in inspector.get_indexes('user')
+    )
+    if not has_unique:
+        for index in User.__table__.indexes:
+            index.create(conn, checkfirst=True)
+
+def rebuild_sqlite_record_table(conn, old_columns):
+    # SQLite は外部キーの変更に ALTER TABLE を使えないため、テーブルを作り直して行をコピーする
+    conn.execute(text('ALTER TABLE record RENAME TO record_old'))
+    for index in Record.__table__.indexes:
+        conn.execute(text(f'DROP INDEX IF EXISTS {index.name}'))
+    Record.__table__.create(conn)
+    copied = ', '.join(c.name for c in Record.__table__.columns if c.name in old_columns)
+    conn.execute(text(f'INSERT INTO record ({copied}) SELECT {copied} FROM record_old'))
+    conn.execute(text('DROP TABLE record_old'))
+
+def upgrade_record_user_fk(conn):
+    # record.user_id の外部キーを ON DELETE CASCADE 付きで作り直す
+    inspector = inspect(conn)
+    user_fk = next(fk for fk in inspector.get_foreign_keys('record') if fk['referred_table'] == 'user')
+    if (user_fk.get('options') or {}).get('ondelete', '').upper() == 'CASCADE':
+        return
+
+    if conn.dialect.name == 'sqlite':
+        rebuild_sqlite_record_table(conn, {c['name'] for c in inspector.get_columns('record')})
+    else:
+        user = conn.dialect.identifier_preparer.quote('user')
+        conn.execute(text(f'ALTER TABLE record DROP CONSTRAINT {user_fk["name"]}'))
+        conn.execute(text(
+            f'ALTER TABLE record ADD CONSTRAINT {user_fk["name"]} '
+            f'FOREIGN KEY (user_id) REFERENCES {user} (id) ON DELETE CASCADE'
+        ))
+
+UPGRADE_STEPS = [
+    upgrade_record_index,
+    upgrade_stiffness_json,
+    upgrade_stiffness_strength_columns,
+    upgrade_username_index,
+    upgrade_record_user_fk,
+]
+
+@app.cli.command("upgrade-db")
+def upgrade_db_command():
+    """既存のデータベースを現在のスキーマに移行します。"""
+    if not inspect(db.engine).has_table('record'):
+        db.create_all()
+        print("データベースを初期化しました。")
+        return
+
+    with db.engine.begin() as conn:
+        for step in UPGRADE_STEPS:
+            step(conn)
+    print("データベースを移行しました。")
@@ -0,0 +1,31 @@
+import os
+
+# --- gunicorn 設定 ---
+# 起動: gunicorn app:app (このファイルは自動的に読み込まれる)
+
+bind = f"0.0.0.0:{os.environ.get('PORT', '8000')}"
+
+# ワーカー数は 2 * CPU数 + 1 を基準とし、環境変数で上書きできるようにする
+workers = int(os.environ.get('WEB_CONCURRENCY', (os.cpu_count() or 1) * 2 + 1))
+worker_class = 'gthread'
+threads = int(os.environ.get('GUNICORN_THREADS', 4))
+
+# アプリケーションを fork 前に読み込み、各ワーカーで共有する
+preload_app = True
+
+# リバースプロキシ (nginx など) との keep-alive 接続を維持する秒数
+keepalive = 5
+
+accesslog = '-'
+errorlog = '-'
+
+
+def when_ready(server):
+    # ワーカーを fork する前にマスタープロセスで一度だけテーブルを作成する
+    # (各ワーカーの起動ごとにスキーマを確認しないよう、app.py の読み込み時には行わない)
+    from app import app, db
+
+    with app.app_context():
+        db.create_all()
+        # マスターで開いた接続をワーカーに引き継がないよう破棄しておく
+        db.engine.dispose()